@@ -0,0 +1,88 @@
+#!python
+"""
+Measure how long the bot takes to be ready, without logging in.
+
+Reports import time per top-level module (from `python -X importtime`) and the time
+spent in each startup phase up to the point where bot.py would call bot.run().
+Exits non-zero if startup is over the target.
+
+    python bench_startup.py [--target SECONDS] [--top N]
+"""
+import argparse
+import collections
+import json
+import os
+import subprocess
+import sys
+from dotenv import load_dotenv
+
+IMPORTS = 'import discord, dotenv, rivals2'
+
+load_dotenv('.env')
+# Same target bot.py warns about, which also counts logging in
+STARTUP_TARGET = float(os.environ.get('STARTUP_TARGET', 5))
+
+READY = '''
+import json, time
+start = time.perf_counter()
+phases = {}
+def phase(name):
+    global start
+    now = time.perf_counter()
+    phases[name] = now - start
+    start = now
+import discord, dotenv
+phase('import discord')
+bot = discord.Bot()
+phase('create bot')
+bot.load_extension('rivals2')
+phase('load extension')
+print(json.dumps(phases))
+'''
+
+def importtimes():
+    """{top-level module: (self seconds summed over its submodules, cumulative seconds)}"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', IMPORTS],
+                            capture_output=True, text=True, check=True)
+    selftime   = collections.Counter()
+    cumulative = collections.Counter()
+    # -X importtime lists each module after everything it imported; walk it backwards
+    # so parents come first, and count a module's cumulative time only if it was not
+    # imported from inside its own package
+    stack = []
+    for line in reversed(result.stderr.splitlines()):
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, total, name = line.removeprefix('import time:').split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        package = name.strip().split('.')[0]
+        del stack[depth:]
+        selftime[package] += int(own) / 1e6
+        if package not in stack:
+            cumulative[package] += int(total) / 1e6
+        stack.append(package)
+    return {package: (selftime[package], cumulative[package]) for package in selftime}
+
+def ready():
+    result = subprocess.run([sys.executable, '-c', READY], capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.splitlines()[-1])
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--target', type=float, default=STARTUP_TARGET,
+                        help=f'Seconds allowed until ready (default $STARTUP_TARGET or 5, currently {STARTUP_TARGET:g})')
+    parser.add_argument('--top', type=int, default=15, help='Modules to list (default 15)')
+    args = parser.parse_args()
+
+    print(f'{"module":<30} {"self":>8} {"cumulative":>11}')
+    times = importtimes()
+    for package, (own, total) in sorted(times.items(), key=lambda item: -item[1][0])[:args.top]:
+        print(f'{package:<30} {own * 1000:>6.1f}ms {total * 1000:>9.1f}ms')
+    print()
+
+    phases = ready()
+    for name, seconds in phases.items():
+        print(f'{name:<30} {seconds * 1000:>6.1f}ms')
+    total = sum(phases.values())
+    print(f'{"ready":<30} {total * 1000:>6.1f}ms (target {args.target * 1000:.0f}ms)')
+    sys.exit(0 if total <= args.target else 1)
@@ -1,10 +1,11 @@
 #!python
+import time
+START = time.perf_counter()
+
 import discord
 import logging
 import os
 import random
-import scrape.dragdown
-from bs4 import BeautifulSoup
 from discord.commands import option
 from discord.ext import commands
 from dotenv import load_dotenv
@@ -14,12 +15,16 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s: %(mes
 load_dotenv('.env')
 token = os.environ['BOT_TOKEN']
 
+# Seconds from process start until we can take interactions; warn if startup gets slower
+STARTUP_TARGET = float(os.environ.get('STARTUP_TARGET', 5))
+
 ## Bot
 intents = discord.Intents.default()
 bot = discord.Bot()
 bot.default_command_integration_types.add(discord.IntegrationType.user_install)
 
 bot.load_extension('rivals2')
+logging.info(f'Imports and extensions loaded in {time.perf_counter() - START:.2f}s')
 
 def prefix_match_key(prefix, dictionary):
     '''
@@ -36,6 +41,11 @@ def list_complete(dictionary, get_name):
 @bot.event
 async def on_ready():
     logging.info(f'We have logged in as {bot.user}')
+    ready = time.perf_counter() - START
+    if ready > STARTUP_TARGET:
+        logging.warning(f'Ready after {ready:.2f}s, over the {STARTUP_TARGET}s startup target')
+    else:
+        logging.info(f'Ready after {ready:.2f}s')
 
 @bot.slash_command(name='ping', description='Are you still there?')
 async def ping(ctx):
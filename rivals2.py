@@ -1,13 +1,19 @@
 #!python
+import asyncio
+import collections
+import datetime
 import discord
+import heapq
 import logging
 import scrape.dragdown
+import scrape.service
 import re
+import time
+from scrape import trace
+from scrape.lazy import aget, loaded_at
 from discord.commands import option
 from discord.ext import commands
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s')
-
 def logreturn(f):
     def wrapped(*args, **kwargs):
         logging.info(f'function called {args} {kwargs}')
@@ -18,34 +24,151 @@ def logreturn(f):
 
 class Completions:
     stripword = re.compile(r'\b[^ a-zA-Z0-9]*|[^ a-zA-Z0-9]*\b')
+    # Discord shows at most 25 choices
+    LIMIT  = 25
+    # Seconds we're willing to spend ranking on each keystroke
+    BUDGET = 0.05
+
+    @classmethod
+    def quality(cls, item, pfx):
+        """4: exact, 3: prefix, 2: prefix of a word, 1: substring, 0: no match"""
+        lower = item.lower()
+        if lower == pfx:
+            return 4
+        stripped = re.sub(cls.stripword, '', lower)
+        if lower.startswith(pfx) or stripped.startswith(pfx):
+            return 3
+        if any(word.startswith(pfx) for word in stripped.split()):
+            return 2
+        if pfx in lower or pfx in stripped:
+            return 1
+        return 0
 
     @classmethod
-    def matchprefix(cls, iterator, pfx):
+    def matches(cls, iterator, pfx, budget=BUDGET):
+        """
+        (quality, item) for every item matching :pfx:, in order, and whether every item was checked.
+
+        Stops scanning once :budget: seconds have passed.
+        """
         if not pfx:
-            return iterator
-        if pfx in iterator:
-            return [pfx]
-        if matched := [item for item in iterator if pfx == item.lower()]:
-            return matched
-        stripped = {re.sub(Completions.stripword, '', item.lower()): item for item in iterator}
-        matched = {stripped[key] for key in stripped if key.startswith(pfx.lower())}
-        matched.update(stripped[key] for key in stripped if any(word.startswith(pfx.lower()) for word in key.split()))
-        if matched:
-            return matched
-        return [x for x in iterator if pfx in x]
+            return [(1, item) for item in iterator], True
+        deadline = time.perf_counter() + budget
+        matched = []
+        for i, item in enumerate(iterator):
+            if i % 64 == 0 and time.perf_counter() > deadline:
+                logging.debug(f'Autocomplete for {pfx!r} out of time after {i} items')
+                return matched, False
+            if q := cls.quality(item, pfx):
+                matched.append((q, item))
+        return matched, True
+
+    @classmethod
+    def rank(cls, matches, scope=(), k=LIMIT):
+        """
+        Best :k: of :matches:, by match quality and then by decayed usage under :scope:
+
+        Uses a bounded heap rather than sorting every match.
+        """
+        now = time.time()
+        scored = (((q, data.usage.score(scope, item, now), -i), item) for i, (q, item) in enumerate(matches))
+        return [item for _, item in heapq.nlargest(k, scored, key=lambda pair: pair[0])]
+
+    # (user, command, option) -> Session from that user's previous keystroke
+    Session = collections.namedtuple('Session', ['parents', 'prefix', 'candidates', 'expires'])
+    sessions = {}
+    SESSION_TTL = 60
+
+    @classmethod
+    def session(cls, key, parents, pfx):
+        """Candidates left over from the last keystroke, if :pfx: only extends what was typed then"""
+        now = time.monotonic()
+        if len(cls.sessions) > 1000:
+            cls.sessions = {k: v for k, v in cls.sessions.items() if v.expires > now}
+        last = cls.sessions.get(key)
+        if last and last.expires > now and last.parents == parents and pfx.startswith(last.prefix):
+            return last.candidates
+        return None
 
     @classmethod
     def completer(cls, getlist, *names):
-        def complete(ctx: discord.AutocompleteContext):
-            it = getlist(*(ctx.options[name] for name in names))
-            return Completions.matchprefix(it, ctx.value)
+        async def complete(ctx: discord.AutocompleteContext):
+            parents = [ctx.options[name] for name in names]
+            pfx = (ctx.value or '').lower()
+            key = (ctx.interaction.user.id, ctx.command.qualified_name, ctx.focused.name)
+            # Anything matching the new prefix matched the one it extends, so only
+            # re-check last keystroke's matches; backspacing or a new parent starts over
+            candidates = cls.session(key, parents, pfx)
+            if candidates is None:
+                # getlist may trigger a cold (blocking) load, keep it off the event loop
+                candidates = await asyncio.to_thread(getlist, *parents)
+            matched, exhaustive = cls.matches(candidates, pfx)
+            if exhaustive:
+                cls.sessions[key] = cls.Session(parents, pfx, [item for _, item in matched],
+                                                time.monotonic() + cls.SESSION_TTL)
+            else:
+                cls.sessions.pop(key, None)
+            return cls.rank(matched, scope=(ctx.command.qualified_name, ctx.focused.name, *parents))
         return complete
 
-wiki = scrape.dragdown.Wiki()
-characters = scrape.dragdown.characterlist(wiki)
-emotes = scrape.dragdown.emotelist(wiki)
+def loaded(obj, name):
+    """When `obj.name` was loaded from the wiki, as an embed timestamp"""
+    if at := loaded_at(obj, name):
+        return datetime.datetime.fromtimestamp(at, datetime.timezone.utc)
+
+def age_note(obj, name):
+    """When `obj.name` was loaded from the wiki, as a line for plain text responses"""
+    if at := loaded_at(obj, name):
+        return f'\n-# as of <t:{int(at)}:R>'
+    return ''
+
+class Paginator(discord.ui.View):
+    """
+    Show a long response one page at a time, editing the same message on prev/next.
+
+    :render: called with a page index, returns the list of embeds for that page.
+    Pages are only rendered when they are shown.
+    """
+    def __init__(self, render, count, timeout=600):
+        super().__init__(timeout=timeout, disable_on_timeout=True)
+        self.render = render
+        self.count  = count
+        self.index  = 0
+        self.update_buttons()
+
+    def update_buttons(self):
+        self.prev.disabled = self.index <= 0
+        self.next.disabled = self.index >= self.count - 1
+        self.position.label = f'{self.index + 1}/{self.count}'
+
+    async def send(self, ctx):
+        with trace.span('render'):
+            embeds = self.render(self.index)
+        if self.count > 1:
+            await ctx.respond(None, embeds=embeds, view=self)
+        else:
+            await ctx.respond(None, embeds=embeds)
+
+    async def turn(self, interaction, step):
+        self.index = max(0, min(self.count - 1, self.index + step))
+        self.update_buttons()
+        await interaction.response.edit_message(embeds=self.render(self.index), view=self)
+
+    @discord.ui.button(label='◀', style=discord.ButtonStyle.secondary)
+    async def prev(self, button, interaction):
+        await self.turn(interaction, -1)
+
+    @discord.ui.button(label='1/1', style=discord.ButtonStyle.secondary, disabled=True)
+    async def position(self, button, interaction):
+        pass
+
+    @discord.ui.button(label='▶', style=discord.ButtonStyle.secondary)
+    async def next(self, button, interaction):
+        await self.turn(interaction, 1)
+
+# Survives reload_extension('rivals2'), along with everything it has cached
+data = scrape.service.get()
 
-logging.info(f'Fetched {len(characters)} characters and {len(emotes)} emotes')
 class FramedataIgnore:
     keys = { 'attack', 'caption', 'character', 'hitboxes', 'images', 'name', }
     values = {'N/A', 'Default', 'SpecifiedAngle', ''}
@@ -88,57 +211,82 @@ class FramedataIgnore:
 
 class Cog(discord.Cog):
 
-    def __init__(self, bot, characters):
+    def __init__(self, bot):
         logging.debug("Loading Rivals 2 Cog")
         self.bot = bot
 
+    def cog_unload(self):
+        data.usage.save()
+
+    @discord.Cog.listener()
+    async def on_ready(self):
+        # Fetch the character list and emotes without holding up startup
+        await asyncio.to_thread(data.warm)
+
+    async def cog_command_error(self, ctx, error):
+        error = getattr(error, 'original', error)
+        if isinstance(error, scrape.dragdown.WikiError):
+            logging.warning(f'{ctx.command}: {error}')
+            await ctx.respond('dragdown.wiki is unavailable right now, try again later')
+        else:
+            raise error
+
+    @staticmethod
+    def record(ctx, *options):
+        """
+        Count a successful lookup for autocomplete ranking.
+
+        :options: are (name, value) pairs in command order; each is scoped by the values before it.
+        """
+        values = []
+        for name, value in options:
+            data.usage.record((ctx.command.qualified_name, name, *values), value)
+            values.append(value)
+
     @discord.slash_command(name='resetc', description='Reload all data for Rivals 2 characters')
+    @trace.command
     async def resetc(self, ctx):
         logging.debug(f'{ctx.command}: {ctx.user}')
         logging.debug(f'{ctx.command}: {ctx.guild} ({ctx.guild_id}) {ctx.channel} ({ctx.channel_id})')
 
-        new = scrape.dragdown.characterlist()
-        characters.update(new)
+        await asyncio.to_thread(data.reset_characters)
         await ctx.respond('Reset!')
 
     @discord.slash_command(name='palette', description='Get a Rivals 2 palette')
     @option('character', description='Rivals 2 Character',
-            autocomplete=discord.utils.basic_autocomplete(characters.keys())
+            autocomplete=Completions.completer(lambda: data.characters.keys())
     )
     @option('skin', description='Choose a skin',
-            autocomplete=Completions.completer(lambda char: characters[char].skins.keys(), 'character')
+            autocomplete=Completions.completer(lambda char: data.characters[char].skins.keys(), 'character')
     )
     @option('palette', description='(Optional) Choose a palette',
-            autocomplete=Completions.completer(lambda char, skin: characters[char].skins[skin].keys(), 'character', 'skin'),
+            autocomplete=Completions.completer(lambda char, skin: data.characters[char].skins[skin].keys(), 'character', 'skin'),
             required=False, default=None
     )
+    @trace.command
     async def palette(self, ctx, character: str, skin: str, palette: str):
         logging.debug(f'{ctx.command}: {ctx.user}')
         logging.debug(f'{ctx.command}: {ctx.guild} ({ctx.guild_id}) {ctx.channel} ({ctx.channel_id})')
         try:
-            c = characters[character]
-            skin_ = c.skins[skin]
-            description = skin_.description
+            c = (await aget(data, 'characters'))[character]
+            skin_ = (await aget(c, 'skins'))[skin]
             if palette:
                 palettes = [skin_[palette]]
-                title = f'{skin} {character} ({palette})'
             else:
-                title = f'{skin} {character}'
                 palettes = [*skin_.values()]
-            # pycord: limit embeds in a response to 10.
-            for i in range(0, len(palettes), 10):
-                embeds = []
-                for pal in palettes[i:i+10]:
-                    embed = discord.Embed(title=title,
-                                          description=description,
-                                          url=c.url + '#' + skin.replace(' ', '_'))
-                    embed.set_image(url=pal.image().replace(' ', '_'))
-                    embed.set_footer(text=pal.unlock, icon_url=skin_.rarity.icon_url() if skin_.rarity else None)
-                    embeds.append(embed)
-                await ctx.respond(None, embeds=embeds)
-                # Less clutter on subsequent embed groups
-                description = None
-                title = f'{skin} {character} (continued)'
+
+            def render(i):
+                pal = palettes[i]
+                embed = discord.Embed(title=f'{skin} {character} ({pal.name})' if pal.name else f'{skin} {character}',
+                                      description=skin_.description,
+                                      url=c.url + '#' + skin.replace(' ', '_'),
+                                      timestamp=loaded(c, 'skins'))
+                embed.set_image(url=pal.image().replace(' ', '_'))
+                embed.set_footer(text=pal.unlock, icon_url=skin_.rarity.icon_url() if skin_.rarity else None)
+                return [embed]
+
+            await Paginator(render, len(palettes)).send(ctx)
+            self.record(ctx, ('character', character), ('skin', skin), ('palette', palette))
 
         except KeyError as e:
             logging.info(f'{ctx.command}: No {character}/{skin}/{palette}', exc_info=e)
@@ -146,64 +294,113 @@ class Cog(discord.Cog):
 
     @discord.slash_command(name='framedata', description='Get frame data for a particular move')
     @option('character', description='Rivals 2 Character',
-            autocomplete=discord.utils.basic_autocomplete(characters.keys())
+            autocomplete=Completions.completer(lambda: data.characters.keys())
     )
     @option('attack', description='Choose an attack',
-            autocomplete=Completions.completer(lambda char: characters[char].framedata.keys(), 'character'),
+            autocomplete=Completions.completer(lambda char: data.characters[char].framedata.keys(), 'character'),
     )
     @option('hit', description='Choose the variant/hit of the attack',
-            autocomplete=Completions.completer(lambda char, attack: characters[char].framedata[attack].keys(), 'character', 'attack'),
+            autocomplete=Completions.completer(lambda char, attack: data.characters[char].framedata[attack].keys(), 'character', 'attack'),
     )
+    @trace.command
     async def framedata(self, ctx, character: str, attack: str, hit: str):
         try:
-            c = characters[character]
-            data = c.framedata[attack][hit]
-            embed = discord.Embed(title=f'{character} {data["attack"]} ({data["name"]})',
-                                  url=c.url + '#' + data["attack"].replace(' ', '_'),
-                                  description='\n'.join([f'- {k}: {v}' for k, v in data.items()
-                                                         if k not in FramedataIgnore.keys
-                                                         and v not in FramedataIgnore.values
-                                                         and (k, v) not in FramedataIgnore.pairs
-                                                         ])
-                                  )
-            if 'caption' in data:
-                embed.set_footer(text=' / '.join(data['caption']), icon_url = c.icon_url if hasattr(c, 'icon_url') else None)
-            if not 'images' in data:
-                await ctx.respond(None, embed=embed)
-            else:
+            c = (await aget(data, 'characters'))[character]
+            hitbox = (await aget(c, 'framedata'))[attack][hit]
+            with trace.span('render'):
+                embed = discord.Embed(title=f'{character} {hitbox["attack"]} ({hitbox["name"]})',
+                                      url=c.url + '#' + hitbox["attack"].replace(' ', '_'),
+                                      description='\n'.join([f'- {k}: {v}' for k, v in hitbox.items()
+                                                             if k not in FramedataIgnore.keys
+                                                             and v not in FramedataIgnore.values
+                                                             and (k, v) not in FramedataIgnore.pairs
+                                                             ]),
+                                      timestamp=loaded(c, 'framedata')
+                                      )
+                if 'caption' in hitbox:
+                    embed.set_footer(text=' / '.join(hitbox['caption']), icon_url = c.icon_url if hasattr(c, 'icon_url') else None)
                 embeds = [embed]
-                for image in data['images']:
+                for image in hitbox.get('images', []):
                     embeds.append(discord.Embed(title=embed.title, url=embed.url).set_image(url=image))
-                await ctx.respond(None, embeds=embeds)
+            await ctx.respond(None, embeds=embeds)
+            self.record(ctx, ('character', character), ('attack', attack), ('hit', hit))
+        except KeyError as e:
+            logging.info(f'{ctx.command}: No {character}/{attack}/{hit}', exc_info=e)
+            await ctx.respond(f'Could not find {e} for {character}/{attack}/{hit}')
+
+    @discord.slash_command(name='punish', description='Which moves punish a move on shield?')
+    @option('character', description='Rivals 2 Character',
+            autocomplete=Completions.completer(lambda: data.characters.keys())
+    )
+    @option('attack', description='Choose an attack',
+            autocomplete=Completions.completer(lambda char: data.characters[char].framedata.keys(), 'character'),
+    )
+    @option('hit', description='(Optional) Only this hit of the attack',
+            autocomplete=Completions.completer(lambda char, attack: data.characters[char].framedata[attack].keys(), 'character', 'attack'),
+            required=False, default=None
+    )
+    @trace.command
+    async def punish(self, ctx, character: str, attack: str, hit: str):
+        # Loading every character's frame data can take longer than Discord waits for a response
+        await ctx.defer()
+        try:
+            guaranteed, early = await data.punishers(character, attack, hit)
+            with trace.span('render'):
+                lines = []
+                for name in sorted(guaranteed.keys() | early.keys()):
+                    moves = [f'{move} {h} ({startup}f)' for startup, move, h, kind in guaranteed.get(name, [])]
+                    moves.extend(f'*{move} {h} ({startup}f)*' for startup, move, h, kind in early.get(name, []))
+                    lines.append(f'- **{name}**: ' + ', '.join(moves))
+                text = '\n'.join(lines) or 'Nothing punishes this on shield.'
+                if early:
+                    text += '\n-# *Italic* moves only punish if it hits shield on its first active frame'
+                pages = scrape.dragdown.split_text(text)
+            title = f'Punishing {character} {attack}' + (f' ({hit})' if hit else '')
+            c = (await aget(data, 'characters'))[character]
+
+            def render(i):
+                return [discord.Embed(title=title, description=pages[i], timestamp=loaded(c, 'framedata'))]
+
+            await Paginator(render, len(pages)).send(ctx)
+            self.record(ctx, ('character', character), ('attack', attack), ('hit', hit))
         except KeyError as e:
             logging.info(f'{ctx.command}: No {character}/{attack}/{hit}', exc_info=e)
             await ctx.respond(f'Could not find {e} for {character}/{attack}/{hit}')
 
     @discord.slash_command(name='topic', description='Get a topic from a character page')
     @option('character', description='Rivals 2 Character',
-            autocomplete=discord.utils.basic_autocomplete(['General', *characters.keys()])
+            autocomplete=Completions.completer(lambda: ['General', *data.characters.keys()])
     )
-    @option('fulltopic', description='Choose a topic',
-            autocomplete=Completions.completer(lambda char: ({'General': wiki} | characters)[char].topics.keys(), 'character'),
+    @option('fulltopic', parameter_name='topic', description='Choose a topic',
+            autocomplete=Completions.completer(lambda char: ({'General': data.wiki} | data.characters)[char].topics.keys(), 'character'),
     )
+    @trace.command
     async def topic(self, ctx, character: str, topic: str):
         try:
-            c   = ({'General': wiki} | characters)[character]
-            obj = c.topics[topic]
-            embed = discord.Embed(title=obj.title, url = obj.url, description=obj.body[:4000])
-            embed.set_footer(text=obj.caption, icon_url = c.icon_url if hasattr(c, 'icon_url') else None)
-            await ctx.respond(None, embed=embed)
+            c   = ({'General': data.wiki} | await aget(data, 'characters'))[character]
+            # Renders the topic's page on first lookup
+            obj = await asyncio.to_thread((await aget(c, 'topics')).__getitem__, topic)
+
+            def render(i):
+                embed = discord.Embed(title=obj.title, url = obj.url, description=obj.pages[i], timestamp=loaded(c, 'topics'))
+                if obj.caption:
+                    embed.set_footer(text=obj.caption, icon_url = c.icon_url if hasattr(c, 'icon_url') else None)
+                return [embed]
+
+            await Paginator(render, len(obj.pages)).send(ctx)
+            self.record(ctx, ('character', character), ('fulltopic', topic))
         except KeyError as e:
             logging.info(f'{ctx.command}: No {character}/{topic}', exc_info=e)
             await ctx.respond(f'Could not find {e} for {character}/{topic}')
 
     @discord.slash_command(name='glossary', description='Get the definition of a term from the glossary')
     @option('term', description='The term to look up',
-            autocomplete=Completions.completer(wiki.glossary.keys)
+            autocomplete=Completions.completer(lambda: data.wiki.glossary.keys())
     )
+    @trace.command
     async def glossary(self, ctx, term: str):
         try:
-            obj = wiki.glossary[term]
+            obj = (await aget(data.wiki, 'glossary'))[term]
             text = [f'**[{obj.term}](<{obj.url()}>)**: {obj.summary}']
             #embed = discord.Embed(title=obj.term, url=obj.url(), description=obj.summary)
             if obj.display:
@@ -214,7 +411,9 @@ class Cog(discord.Cog):
             if obj.aliases:
                 text.extend(['\n-# (Also known as ', ', '.join(repr(alias) for alias in obj.aliases), ')' ])
                 #embed.add_field(name='Also known as', value=', '.join(obj.aliases))
+            text.append(age_note(data.wiki, 'glossary'))
             await ctx.respond(''.join(text))
+            self.record(ctx, ('term', term))
             #await ctx.respond(embed=embed)
         except KeyError as e:
             logging.info(f'{ctx.command}: No glossary term {term}', exc_info=e)
@@ -222,34 +421,39 @@ class Cog(discord.Cog):
 
     @discord.slash_command(name='stats', description='Get general stats for a Rivals 2 character')
     @option('character', description='Rivals 2 Character',
-            autocomplete=discord.utils.basic_autocomplete(characters.keys())
+            autocomplete=Completions.completer(lambda: data.characters.keys())
     )
+    @trace.command
     async def stats(self, ctx, character: str):
         try:
-            c = characters[character]
+            c = (await aget(data, 'characters'))[character]
             embed = discord.Embed(title=f'{character}',
-                                  description='\n'.join([f'- {k}: {v}' for k, v in c.stats.items() if k != 'chara'])
+                                  description='\n'.join([f'- {k}: {v}' for k, v in (await aget(c, 'stats')).items() if k != 'chara']),
+                                  timestamp=loaded(c, 'stats')
                                   )
             await ctx.respond(None, embed=embed)
+            self.record(ctx, ('character', character))
         except KeyError as e:
             logging.info(f'{ctx.command}: No {character}', exc_info=e)
             await ctx.respond(f'Could not find stats for {character}')
 
     @discord.slash_command(name='emote', description='Get a Rivals 2 Emote!')
     @option('name', description='Name of the emote',
-            autocomplete=Completions.completer(emotes.keys)
+            autocomplete=Completions.completer(lambda: data.emotes.keys())
             )
+    @trace.command
     async def emote(self, ctx, name: str):
         logging.debug(f'{ctx.command}: {ctx.user}')
         logging.debug(f'{ctx.command}: {ctx.guild} ({ctx.guild_id}) {ctx.channel} ({ctx.channel_id})')
         try:
-            emote = emotes[name]
+            emote = (await aget(data, 'emotes'))[name]
             url   = emote.url()
-            await ctx.respond(f'**{emote.text}**\n-# [{emote.unlock.replace("\n", " - ")}]({url})')
+            await ctx.respond(f'**{emote.text}**\n-# [{emote.unlock.replace("\n", " - ")}]({url})' + age_note(data, 'emotes'))
+            self.record(ctx, ('name', name))
         except KeyError as e:
             logging.info(f'{ctx.command}: No emote {name}', exc_info=e)
             await ctx.respond(f'Could not find {name}')
 
 
 def setup(bot):
-    bot.add_cog(Cog(bot, characters))
+    bot.add_cog(Cog(bot))
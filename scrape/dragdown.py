@@ -1,16 +1,27 @@
 #!python
 import collections
+import collections.abc
 import enum
 import re
 import itertools
 import logging
-import requests
-import mwparserfromhell as mw
+import os
+import sys
+import threading
+import time
+from scrape.lazy import flights, lazy, lazy_import
+from scrape.trace import span, traced
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s')
+# Only imported once something is fetched or parsed, to keep bot startup fast
+mw       = lazy_import('mwparserfromhell')
+requests = lazy_import('requests')
 
 DEBUGGING = True
+# Set VERIFY_EXTRACTORS=1 to also run the full parse after each streaming extractor and compare the results
+VERIFY_EXTRACTORS = os.environ.get('VERIFY_EXTRACTORS', '') not in ('', '0')
 BASEURL = 'https://dragdown.wiki/wiki/'
+# Seconds before loaded pages are revalidated in the background
+MAX_AGE = 6 * 3600
 
 class SparseList(list):
     def __setitem__(self, index, value):
@@ -23,55 +34,220 @@ class SparseList(list):
         try: return list.__getitem__(self, index)
         except IndexError: return None
 
+@traced('mw.parse')
+def parse(text):
+    return mw.parse(text)
+
+class RawPage(collections.namedtuple('RawPage', ['ok', 'content'])):
+    """The parts of a requests.Response that the loaders use"""
+
+class WikiError(Exception):
+    """The wiki is down, or could not give us a page we need"""
+
+class CircuitBreaker:
+    """
+    Stop calling a failing upstream for a while.
+
+    After :threshold: consecutive failures the breaker opens and calls fail fast for
+    :cooldown: seconds. Then a single trial call is let through, and its outcome
+    closes the breaker again or restarts the cooldown.
+    """
+    def __init__(self, threshold=5, cooldown=60):
+        self.threshold = threshold
+        self.cooldown  = cooldown
+        self.failures  = 0
+        self.opened    = None
+        self.trial     = False
+        self._lock     = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.opened is None:
+                return True
+            if not self.trial and time.monotonic() - self.opened >= self.cooldown:
+                self.trial = True
+                return True
+            return False
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened   = None
+            self.trial    = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.trial or self.failures >= self.threshold:
+                if self.opened is None or self.trial:
+                    logging.warning(f'Circuit breaker open after {self.failures} failures, pausing for {self.cooldown}s')
+                self.opened = time.monotonic()
+            self.trial = False
+
+class HTTPSource:
+    """Fetch raw wikitext from the live wiki"""
+    def __init__(self, user_agent=None, timeout=10):
+        self.user_agent = user_agent
+        self.timeout    = timeout
+
+    @lazy
+    def session(self):
+        session = requests.Session()
+        if self.user_agent:
+            session.headers.update({'User-Agent': self.user_agent})
+        return session
+
+    def get(self, path):
+        return self.session.get(BASEURL + path, params={'action': 'raw'}, timeout=self.timeout)
+
+    def close(self):
+        if hasattr(self, '_session'):
+            self._session.close()
+
+class DumpSource:
+    """
+    Serve raw wikitext from a MediaWiki Special:Export XML dump instead of the live wiki.
+
+    The dump is parsed incrementally and each <page> element is discarded once read.
+    Only the latest text of pages the loaders can ask for is kept (see KEEP, plus the
+    project namespace), so memory grows with the RoA2 pages rather than the whole dump.
+    The dump must include the templates and project pages the loaders read
+    (Template:CharLinks, Template:RoA2_SysMech_Navigation, Project:ROA2_Character_Select),
+    not just the RoA2 pages.
+    """
+    KEEP = ('RoA2/', 'Template:')
+
+    def __init__(self, file):
+        self.texts     = {}
+        self.redirects = {}
+        self.project   = 'Project'
+        self.load(file)
+
+    def wanted(self, title):
+        return title.startswith((*self.KEEP, self.project + ':', 'Project:'))
+
+    @staticmethod
+    def normalize(title):
+        title = title.replace('_', ' ').strip()
+        return title[:1].upper() + title[1:]
+
+    def load(self, file):
+        from xml.etree import ElementTree
+        events = ElementTree.iterparse(file, events=('start', 'end'))
+        _, root = next(events)
+        for event, elem in events:
+            if event != 'end':
+                continue
+            tag = elem.tag.rsplit('}', 1)[-1]
+            if tag == 'namespace' and elem.get('key') == '4' and elem.text:
+                self.project = elem.text
+            elif tag == 'page':
+                ns = elem.tag[:-len(tag)]
+                title = self.normalize(elem.findtext(ns + 'title'))
+                if self.wanted(title):
+                    redirect = elem.find(ns + 'redirect')
+                    if redirect is not None:
+                        self.redirects[title] = self.normalize(redirect.get('title'))
+                    # Special:Export lists revisions oldest first
+                    texts = elem.findall(f'{ns}revision/{ns}text')
+                    if texts:
+                        self.texts[title] = texts[-1].text or ''
+                # Drop the page (and anything before it) so memory stays flat
+                root.clear()
+
+    def get(self, path):
+        title = self.normalize(path)
+        if title.startswith('Project:'):
+            title = self.project + title.removeprefix('Project')
+        for _ in range(5):
+            if title not in self.redirects:
+                break
+            title = self.redirects[title]
+        if title not in self.texts:
+            return RawPage(False, b'')
+        return RawPage(True, self.texts[title].encode())
+
+    def close(self):
+        pass
+
 class Wiki:
-    def __init__(self, user_agent=None):
-        self.session = requests.Session()
-        if user_agent:
-            self.session.headers.update({'User-Agent': user_agent})
+    def __init__(self, user_agent=None, source=None):
+        self.source = source or HTTPSource(user_agent)
+        self.breaker = CircuitBreaker()
         self._templates = {}
+        # Called as hook(character, framedata) whenever a character's frame data is loaded
+        self.framedata_hooks = []
 
     def __enter__(self):
         return self
 
     def __exit__(self, *args):
-        self.session.__exit__(*args)
+        self.source.close()
 
     def fetch(self, path):
-        return self.session.get(BASEURL + path, params={'action': 'raw'})
+        """
+        Fetch a page; raises WikiError if the wiki is unreachable or erroring.
+
+        A missing page is not an error here: the response is returned and `.ok` is False.
+        """
+        with span(f'fetch {path}'):
+            if not self.breaker.allow():
+                raise WikiError(f'Not fetching {path}: the wiki has been failing, waiting for it to recover')
+            try:
+                response = self.source.get(path)
+            except requests.RequestException as e:
+                self.breaker.failure()
+                raise WikiError(f'Failed to fetch {path}: {e}') from e
+            except Exception:
+                # Anything else still has to settle a half-open trial, or the breaker never closes
+                self.breaker.failure()
+                raise
+            status = getattr(response, 'status_code', 200)
+            if status >= 500 or status == 429:
+                self.breaker.failure()
+                raise WikiError(f'Failed to fetch {path}: HTTP {status}')
+            self.breaker.success()
+            return response
+
+    def text(self, path):
+        """Fetch a page we can't do without, raising WikiError instead of parsing an error body"""
+        response = self.fetch(path)
+        if not response.ok:
+            raise WikiError(f'Failed to fetch {path}: HTTP {getattr(response, "status_code", 404)}')
+        return response.content.decode()
 
     def get_template(self, path):
         if path in self._templates:
             return self._templates[path]
+        return flights.do((self, 'Template:' + path), lambda: self._load_template(path))
+
+    def _load_template(self, path):
         request = self.fetch('Template:' + path)
         if not request.ok:
             return None
-        page = mw.parse(request.content.decode())
+        page = parse(request.content.decode())
         try:
             self._templates[path] = next(page.ifilter_tags(matches=lambda node: node.tag == 'includeonly')).contents
         except StopIteration:
             self._templates[path] = page
         return self._templates[path]
 
-    @property
+    @lazy(max_age=MAX_AGE)
     def general_pages(self):
-        if hasattr(self, '_general_pages'):
-            return self._general_pages
-        self._general_pages = {}
+        general_pages = {}
         subs = (card.get('page').value.strip() for card in self.get_template('RoA2_SysMech_Navigation').ifilter_templates(matches=lambda node: node.name == 'PageNavCard'))
         for sub in subs:
             if not sub:
                 continue
             request = self.fetch(sub)
             if request.ok:
-                self._general_pages[sub] = mw.parse(request.content.decode())
-        return self._general_pages
+                general_pages[sub] = request.content.decode()
+        return general_pages
 
-    @property
+    @lazy(max_age=MAX_AGE)
     def glossary(self):
-        if hasattr(self, '_glossary'):
-            return self._glossary
-        self._glossary = {}
-        wikitext = mw.parse(self.fetch('RoA2/Glossary').content.decode())
+        glossary = {}
+        wikitext = parse(self.text('RoA2/Glossary'))
         for node in wikitext.ifilter_templates(matches=lambda node: node.name == 'GlossaryData-ROA2'):
             # Skip if there's no term or summary
             try:
@@ -96,17 +272,88 @@ class Wiki:
                 display = BASEURL + 'Special:Redirect/file/' + display
 
             obj = GlossaryTerm(term, summary, aliases, links, display)
-            self._glossary[term] = obj
+            glossary[term] = obj
             for alias in aliases:
-                self._glossary[alias] = obj
-        return self._glossary
+                glossary[alias] = obj
+        return glossary
 
-    @property
+    @lazy(source='general_pages')
     def topics(self):
-        if hasattr(self, '_topics'):
-            return self._topics
-        self._topics = build_topics(self.general_pages)
-        return self._topics
+        return Topics(self.general_pages)
+
+# Wikitext mwparserfromhell keeps as plain text, so templates, tables and headings in it don't count
+UNPARSED = re.compile(r'<!--.*?(?:-->|$)|<nowiki\s*>.*?(?:</nowiki\s*>|$)|<nowiki\s*/>', re.S | re.I)
+BRACES = re.compile(r'\{\{+|\}\}+')
+TABLE_DELIMITER = re.compile(r'(?m)^[ \t]*(\{\||\|\})|<(/?)table\b[^>]*>', re.I)
+
+def iter_templates(text, prefix):
+    """
+    Yield the raw wikitext of each outermost {{<prefix>...}} invocation in :text:
+
+    Templates nested inside a match are left to whoever parses the fragment.
+    Only runs of two or more braces open or close anything, like in the parser, so a
+    stray { or } inside a parameter doesn't end the template early. A closing run can
+    close several levels at once, e.g. the }}}}} after {{{1|{{x}}.
+    """
+    text = UNPARSED.sub('', text)
+    pos = 0
+    while (start := text.find('{{' + prefix, pos)) >= 0:
+        depth = 0
+        for brace in BRACES.finditer(text, start):
+            if brace.group()[0] == '{':
+                depth += len(brace.group())
+                continue
+            if len(brace.group()) >= depth:
+                pos = brace.start() + depth
+                break
+            depth -= len(brace.group())
+        else:
+            raise ValueError(f'Unterminated template at {start}: {text[start:start + 40]!r}')
+        yield text[start:pos]
+
+def parse_template(fragment):
+    """Parse a fragment from iter_templates, raising unless it is exactly one whole template"""
+    code = parse(fragment)
+    if len(code.nodes) != 1 or not isinstance(code.nodes[0], mw.nodes.Template):
+        raise ValueError(f'Fragment is not a single template: {fragment[:40]!r}')
+    return code
+
+def iter_tables(text):
+    """
+    Yield the raw wikitext of each outermost table ({| ... |} or <table> ... </table>) in :text:
+    """
+    text = UNPARSED.sub('', text)
+    depth = 0
+    for delim in TABLE_DELIMITER.finditer(text):
+        opening = delim.group(1) == '{|' or (delim.group(1) is None and not delim.group(2))
+        if opening:
+            if depth == 0:
+                start = delim.start(1) if delim.group(1) else delim.start()
+            depth += 1
+        elif depth:
+            depth -= 1
+            if depth == 0:
+                yield text[start:delim.end()]
+    if depth:
+        raise ValueError(f'Unterminated table at {start}: {text[start:start + 40]!r}')
+
+def extract(fast, full, what):
+    """
+    Run the streaming extractor :fast:, falling back to the full parse :full: if it fails.
+
+    With VERIFY_EXTRACTORS set, :full: is also run and wins if the results differ.
+    """
+    try:
+        result = fast()
+    except Exception as e:
+        logging.warning(f'Streaming extractor failed for {what}, falling back to full parse', exc_info=e)
+        return full()
+    if VERIFY_EXTRACTORS:
+        expected = full()
+        if result != expected:
+            logging.warning(f'Streaming extractor disagrees with full parse for {what}')
+            return expected
+    return result
 
 def table_by_columns(node):
     ret = {}
@@ -176,18 +423,43 @@ class SkinPalette:
         return 'SkinPalette({!r}, {!r}, {!r})'.format(
                 self.name, self.imagelink, self.unlock)
 
+def split_text(text, limit=4000):
+    """
+    Split :text: into chunks of at most :limit: characters,
+    preferring to break between paragraphs, then lines, then words.
+    """
+    chunks = []
+    while len(text) > limit:
+        for sep in ('\n\n', '\n', ' '):
+            cut = text.rfind(sep, 0, limit)
+            if cut > 0:
+                break
+        else:
+            cut = limit
+        chunks.append(text[:cut].rstrip())
+        text = text[cut:].lstrip()
+    if text or not chunks:
+        chunks.append(text)
+    return chunks
+
 class Topic:
+    # Discord allows 4096 characters in an embed description
+    PAGESIZE = 4000
+
     def __init__(self, title, url, body, caption=None, image=None):
         self.title = title
         self.url = url
         self.body = body
         self.caption = caption
         self.image = image
+        # Split once here so each page can be shown without re-slicing the body
+        self.pages = split_text(body, self.PAGESIZE)
 
     def image_url(self):
         if self.image:
             return BASEURL + 'Special:Redirect/file/' + self.imagelink.title.removeprefix('File:')
 
+@traced('build_topics')
 def build_topics(pages):
     """
     Manual parsing.
@@ -278,6 +550,103 @@ def build_topics(pages):
         add_topic(topics, heading, parts)
     return topics
 
+TOPIC_MARKER = re.compile(r'(?m)^(=+)(.+?)\1[ \t]*$|\{\{\s*TheoryBox\b')
+
+@traced('topic_titles')
+def topic_titles(pagetitle, text):
+    """
+    Cheaply list the topic names build_topics would produce for a page, without rendering it.
+
+    Only the level 1-2 headings and TheoryBox titles are looked at, and like build_topics
+    a name is only listed if some non-blank text belongs to it. Text that only renders
+    to nothing can still slip through; Topics drops those names once the page renders.
+    """
+    text = UNPARSED.sub('', text)
+    heading = SparseList()
+    heading[0] = pagetitle
+    names = []
+    def name(heading):
+        name = [heading[0].rsplit('/', 1)[-1]] + heading[1:]
+        return ' > '.join([x.strip() for x in name if x]).replace('\\', '')
+
+    current, pos = name(heading), 0
+    def text_until(end):
+        # Listed where build_topics would first add it
+        if text[pos:end].strip() and current not in names:
+            names.append(current)
+
+    for marker in TOPIC_MARKER.finditer(text):
+        # Level 3+ headings are part of the topic's text; skip markers inside a TheoryBox
+        if marker.start() < pos or (marker.group(1) and len(marker.group(1)) >= 3):
+            continue
+        text_until(marker.start())
+        if marker.group(1):
+            heading = SparseList(heading[:len(marker.group(1))])
+            heading[len(marker.group(1))] = nodes_to_text(parse(marker.group(2)).nodes)
+            current, pos = name(heading), marker.end()
+            continue
+        try:
+            box = next(iter_templates(text[marker.start():], marker.group().removeprefix('{{')))
+            code = parse(box).get(0)
+            title = code.get('Title').value.strip()
+        except (StopIteration, ValueError, IndexError):
+            continue
+        pos = marker.start() + len(box)
+        if any(str(param.value).strip() for param in code.params
+               if param.name.strip() not in ('Title', 'Oneliner')):
+            names.append(name(heading + [title]))
+    text_until(len(text))
+    return names
+
+class Topics(collections.abc.Mapping):
+    """
+    Topics across several pages, rendered one page at a time.
+
+    Keys come from a cheap title index (topic_titles), so autocomplete never has to
+    render anything. Looking up a topic renders only the page it is on, and that page's
+    topics are kept for next time.
+    """
+    # Mapping drops hashing, but renders are single-flighted on (self, page)
+    __hash__ = object.__hash__
+
+    def __init__(self, pages):
+        self.pages = pages
+        self._rendered = {}
+        self._lock = threading.Lock()
+        self._index = {name: pagetitle for pagetitle, text in pages.items()
+                       for name in topic_titles(pagetitle, text)}
+
+    def render(self, pagetitle):
+        if pagetitle not in self._rendered:
+            flights.do((self, pagetitle), lambda: self._render(pagetitle))
+        return self._rendered[pagetitle]
+
+    def _render(self, pagetitle):
+        if pagetitle in self._rendered:
+            return
+        topics = build_topics({pagetitle: parse(self.pages[pagetitle])})
+        # Fix up the index with what rendering actually produced; swap in a new dict
+        # rather than mutating the one autocomplete may be iterating over. Renders of
+        # other pages run concurrently, so each fix-up has to start from the last one.
+        with self._lock:
+            self._rendered[pagetitle] = topics
+            index = {name: page for name, page in self._index.items()
+                     if page != pagetitle or name in topics}
+            index.update((name, pagetitle) for name in topics)
+            self._index = index
+
+    def __getitem__(self, name):
+        return self.render(self._index[name])[name]
+
+    def __iter__(self):
+        # A render while iterating can drop names from the index; don't yield those
+        for name, page in self._index.items():
+            if page not in self._rendered or name in self._rendered[page]:
+                yield name
+
+    def __len__(self):
+        return len(self._index)
+
 def nodes_to_text(nodes, pagetitle=None, suppress_links=False):
     """This is the general purpose function for converting nodes into text.
 
@@ -479,28 +848,20 @@ class Character:
         self.icon_url = BASEURL + 'Special:Redirect/file/' + '_'.join(path.split('/')) + '_Stock.png'
         self.image_url = BASEURL + 'Special:Redirect/file/' + '_'.join(path.split('/')) + '_Portrait.png'
 
-    @property
+    @lazy(max_age=MAX_AGE)
     def page(self):
-        if hasattr(self, '_page'):
-            return self._page
-        self._page = mw.parse(self.wiki.fetch(self.path).content.decode())
-        return self._page
+        return parse(self.wiki.text(self.path))
 
     """"
     Single flat dict, since completion works well
     """
-    @property
+    @lazy(source='pages')
     def topics(self):
-        if hasattr(self, '_topics'):
-            return self._topics
-        self._topics = build_topics(self.pages)
-        return self._topics
+        return Topics(self.pages)
 
-    @property
+    @lazy(max_age=MAX_AGE)
     def pages(self):
-        if hasattr(self, '_pages'):
-            return self._pages
-        self._pages = {}
+        pages = {}
         subs = (x.title.removeprefix('{{{charMainPage}}}') for x in self.wiki.get_template('CharLinks').ifilter_wikilinks())
         for sub in subs:
             sub = self.path + sub
@@ -508,58 +869,34 @@ class Character:
                 continue
             request = self.wiki.fetch(sub)
             if request.ok:
-                self._pages[sub] = mw.parse(request.content.decode())
-        return self._pages
+                pages[sub] = request.content.decode()
+        return pages
 
-    @property
+    @lazy(max_age=MAX_AGE)
     def data(self):
-        if hasattr(self, '_data'):
-            return self._data
-        self._data = self.wiki.fetch(self.path + '/Data').content.decode()
-        return self._data
+        return self.wiki.text(self.path + '/Data')
 
-    @property
+    @lazy(source='data')
     def stats(self):
-        if hasattr(self, '_stats'):
-            return self._stats
         data  = self.data
         start = data.find('{{Character')
         end   = data.find('\n}}', start)
         stats = (s.split('=') for s in data[start:end].split('|')[1:])
-        self._stats = {k.strip(): v.strip() for k, v in stats}
-        return self._stats
+        return {k.strip(): v.strip() for k, v in stats}
 
-    @property
+    @lazy(source='data')
     def framedata(self):
-        if hasattr(self, '_framedata'):
-            return self._framedata
-        self._framedata = {}
-        data = mw.parse(self.data).ifilter_templates(matches=lambda node: node.name.startswith("FrameData"))
-        for code in data:
-            hitbox = {}
-            for param in code.params:
-                name  = param.name.strip()
-                if name == 'images':
-                    hitbox['images'] = [BASEURL + 'Special:Redirect/file/' + x.strip() for x in str(param.value).split('\\')]
-                    continue
-                hitbox[param.name.strip()] = nodes_to_text(param.value.nodes).strip()
+        data = self.data
+        framedata = extract(lambda: framedata_streaming(data), lambda: framedata_parsed(data), self.path + '/Data')
+        for hook in self.wiki.framedata_hooks:
+            hook(self, framedata)
+        return framedata
 
-            if 'caption' in hitbox:
-                hitbox['caption'] = [x.strip() for x in re.split(r'\s\\\\\s', hitbox['caption'])]
-
-            if hitbox['attack'] not in self._framedata:
-                self._framedata[hitbox['attack']] = {hitbox['name']: hitbox}
-            else:
-                self._framedata[hitbox['attack']][hitbox['name']] = hitbox
-        return self._framedata
-
-    @property
+    @lazy(source='page')
     def skins(self):
-        if hasattr(self, '_skins'):
-            return self._skins
         page = self.page
         head = next(page.ifilter_headings(matches=lambda node: node.title.strip() == 'Cosmetics'))
-        self._skins = {}
+        skins = {}
         # ASSUMPTION: Page ordered as
         # Heading
         # (Optional) skin description
@@ -591,14 +928,49 @@ class Character:
                             description = ''.join(description)
                         else:
                             description = None
-                        self._skins[skin] = Skin({palette.name: palette for palette in palettes},
-                                        description=description, rarity=rarity)
+                        skins[skin] = Skin({palette.name: palette for palette in palettes},
+                                           description=description, rarity=rarity)
                         continue
             resolve_node_generic(node, nodes, description)
-        return self._skins
+        return skins
+
+def is_framedata(node):
+    return node.name.startswith("FrameData")
+
+def framedata_streaming(text):
+    """Frame data from a /Data page, parsing only the FrameData* templates"""
+    return framedata_from_templates(template for fragment in iter_templates(text, 'FrameData')
+                                    for template in parse_template(fragment).ifilter_templates(matches=is_framedata))
+
+def framedata_parsed(text):
+    """Frame data from a /Data page, parsing the whole page"""
+    return framedata_from_templates(parse(text).ifilter_templates(matches=is_framedata))
+
+@traced('framedata_from_templates')
+def framedata_from_templates(templates):
+    """Collect FrameData* templates into {attack: {hit name: hitbox}}"""
+    framedata = {}
+    for code in templates:
+        hitbox = {}
+        for param in code.params:
+            name  = param.name.strip()
+            if name == 'images':
+                hitbox['images'] = [BASEURL + 'Special:Redirect/file/' + x.strip() for x in str(param.value).split('\\')]
+                continue
+            hitbox[param.name.strip()] = nodes_to_text(param.value.nodes).strip()
+
+        if 'caption' in hitbox:
+            hitbox['caption'] = [x.strip() for x in re.split(r'\s\\\\\s', hitbox['caption'])]
+
+        if hitbox['attack'] not in framedata:
+            framedata[hitbox['attack']] = {hitbox['name']: hitbox}
+        else:
+            framedata[hitbox['attack']][hitbox['name']] = hitbox
+    return framedata
 
-def characterlist(wiki=Wiki()):
-    text = wiki.fetch('Project:ROA2_Character_Select').content.decode()
+def characterlist(wiki=None):
+    wiki = wiki or Wiki()
+    text = wiki.text('Project:ROA2_Character_Select')
     names = (char.group(1) for char in re.finditer(r'character=([^ |]*)', text))
     return {name: Character(wiki, 'RoA2/' + name) for name in names}
 
@@ -615,16 +987,21 @@ class Emote:
         self.text   = text.contents.strip()
         self.filename = filename.contents.nodes[0]
 
+    def __eq__(self, other):
+        return isinstance(other, Emote) and vars(self) == vars(other)
+
     def url(self):
         return BASEURL + 'Special:Redirect/file/' + self.filename.title.removeprefix('File:')
 
-def emotelist(wiki=Wiki()):
-    tables = mw.parse(wiki.fetch('RoA2/Emotes').content.decode()).ifilter_tags(matches=lambda node: node.tag == 'table')
+def emote_rows(code):
+    tables = code.ifilter_tags(matches=lambda node: node.tag == 'table')
     tables = (table.contents.ifilter_tags(matches=lambda node: node.tag == 'tr') for table in tables)
-    rows   = (row.contents.ifilter_tags(matches=lambda node: node.tag in ('td', 'th')) for row in itertools.chain(*tables))
+    return ([*row.contents.ifilter_tags(matches=lambda node: node.tag in ('td', 'th'))] for row in itertools.chain(*tables))
+
+@traced('emotes_from_rows')
+def emotes_from_rows(wiki, rows):
     emotes = {}
     for row in rows:
-        row = [*row]
         try:
             emote = Emote(wiki, row)
             emotes[f'{emote.name.title()} "{emote.text}"'] = emote
@@ -632,9 +1009,66 @@ def emotelist(wiki=Wiki()):
             logging.info(f'Failed for row {row}')
     return emotes
 
+def emotes_streaming(wiki, text):
+    """Emotes from RoA2/Emotes, parsing only its tables"""
+    return emotes_from_rows(wiki, (row for fragment in iter_tables(text) for row in emote_rows(parse(fragment))))
+
+def emotes_parsed(wiki, text):
+    """Emotes from RoA2/Emotes, parsing the whole page"""
+    return emotes_from_rows(wiki, emote_rows(parse(text)))
+
+def emotelist(wiki=None):
+    wiki = wiki or Wiki()
+    text = wiki.text('RoA2/Emotes')
+    return extract(lambda: emotes_streaming(wiki, text), lambda: emotes_parsed(wiki, text), 'RoA2/Emotes')
+
+def export(wiki, characters, emotes):
+    """Collect everything the bot serves into plain JSON-serializable data"""
+    def topics(obj):
+        return {name: {'url': t.url, 'body': t.body, 'caption': t.caption} for name, t in obj.topics.items()}
+
+    data = {
+        'characters': {},
+        'emotes': {key: {'text': e.text, 'unlock': e.unlock, 'rarity': e.rarity, 'url': e.url()}
+                   for key, e in emotes.items()},
+        'glossary': {key: term._asdict() for key, term in wiki.glossary.items()},
+        'topics': topics(wiki),
+    }
+    for name, char in characters.items():
+        try:
+            data['characters'][name] = {
+                'stats': char.stats,
+                'framedata': char.framedata,
+                'skins': {skin_name: {
+                    'description': skin.description,
+                    'rarity': skin.rarity,
+                    'palettes': {pal.name: {'image': pal.image(), 'unlock': pal.unlock} for pal in skin.values()},
+                } for skin_name, skin in char.skins.items()},
+                'topics': topics(char),
+            }
+        except Exception as e:
+            logging.warning(f'Failed to export {name}', exc_info=e)
+    return data
+
 if __name__ == '__main__':
+    import argparse
     import json
-    with Wiki() as wiki:
-        char = Character(wiki, 'RoA2/Maypul')
-        print(char.topics['Techniques - Wrap'])
-
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s')
+    parser = argparse.ArgumentParser(description='Scrape Rivals 2 data from dragdown.wiki')
+    parser.add_argument('--dump', metavar='XML', help='Build from a Special:Export XML dump instead of the live wiki')
+    parser.add_argument('--out', metavar='JSON', help='Write the derived dataset to this file (- for stdout)')
+    args = parser.parse_args()
+
+    if not args.dump and not args.out:
+        with Wiki() as wiki:
+            char = Character(wiki, 'RoA2/Maypul')
+            print(char.topics['Techniques - Wrap'])
+    else:
+        with Wiki(source=DumpSource(args.dump) if args.dump else None) as wiki:
+            data = export(wiki, characterlist(wiki), emotelist(wiki))
+        if not args.out or args.out == '-':
+            json.dump(data, sys.stdout, indent=1)
+        else:
+            with open(args.out, 'w') as f:
+                json.dump(data, f, indent=1)
+        logging.info(f'Exported {len(data["characters"])} characters and {len(data["emotes"])} emotes')
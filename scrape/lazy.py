@@ -0,0 +1,217 @@
+"""
+Concurrency-safe lazy loading.
+
+The loaders on Wiki and Character are expensive (network + parsing), and when a new
+patch drops many people ask about the same character at once. SingleFlight makes sure
+only one load for a given key is running at a time: everyone else waits on the result
+of the load already in flight, whether they are calling from a worker thread or from
+the asyncio event loop.
+"""
+import asyncio
+import concurrent.futures
+import contextvars
+import importlib
+import logging
+import threading
+import time
+from scrape.trace import span
+
+class SingleFlight:
+    """
+    Coalesce concurrent loads of the same key into one.
+
+    :timeout: seconds any caller will wait for a load before giving up with TimeoutError.
+        The load itself keeps running, so a later call can still pick up its result.
+    :error_ttl: seconds a failed load is remembered; calls in that window re-raise
+        the same error instead of hammering the wiki again.
+    """
+    def __init__(self, timeout=60, error_ttl=10):
+        self.timeout   = timeout
+        self.error_ttl = error_ttl
+        self._lock     = threading.Lock()
+        self._inflight = {}
+        self._errors   = {}
+
+    def claim(self, key):
+        """(future for :key:, whether the caller claimed it and has to run the load)"""
+        with self._lock:
+            if key in self._errors:
+                expires, error = self._errors[key]
+                if time.monotonic() < expires:
+                    raise error
+                del self._errors[key]
+            if key in self._inflight:
+                return self._inflight[key], False
+            future = self._inflight[key] = concurrent.futures.Future()
+            return future, True
+
+    def start(self, key, fn):
+        """Return the future for :key:, starting :fn: in a new thread if nothing is in flight"""
+        future, claimed = self.claim(key)
+        if claimed:
+            # Copy the context so spans/contextvars set by the caller are visible to the load
+            context = contextvars.copy_context()
+            threading.Thread(target=context.run, args=(self._run, key, future, fn), daemon=True).start()
+        return future
+
+    def _run(self, key, future, fn):
+        try:
+            result = fn()
+        except BaseException as e:
+            with self._lock:
+                self._errors[key] = (time.monotonic() + self.error_ttl, e)
+                del self._inflight[key]
+            future.set_exception(e)
+        else:
+            with self._lock:
+                del self._inflight[key]
+            future.set_result(result)
+
+    def do(self, key, fn):
+        """Blocking: run (or join) the load for :key:; a load this call claims runs in the calling thread"""
+        future, claimed = self.claim(key)
+        if claimed:
+            self._run(key, future, fn)
+        try:
+            return future.result(timeout=self.timeout)
+        except concurrent.futures.TimeoutError:
+            raise TimeoutError(f'Timed out after {self.timeout}s waiting for {key}')
+
+    async def ado(self, key, fn):
+        """Async: run (or join) the load for :key: without blocking the event loop"""
+        future = asyncio.wrap_future(self.start(key, fn))
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f'Timed out after {self.timeout}s waiting for {key}')
+
+flights = SingleFlight()
+
+class lazy_import:
+    """
+    Stand-in for a module that is only imported when one of its attributes is used.
+
+    Attributes are copied onto the stand-in as they are looked up, so after the first
+    use it costs the same as the real module. importlib's import lock keeps concurrent
+    first uses from different threads safe.
+    """
+    def __init__(self, name):
+        self.__name = name
+
+    def __getattr__(self, attr):
+        value = getattr(importlib.import_module(self.__name), attr)
+        setattr(self, attr, value)
+        return value
+
+class lazy:
+    """
+    Like functools.cached_property, but loads go through a SingleFlight.
+
+    The result is stored on the instance as `_<name>`, matching the `hasattr(self, '_x')`
+    convention, so deleting that attribute forces a reload on next access.
+
+    With :max_age: (seconds), an older value is still returned straight away while it is
+    reloaded in the background (stale-while-revalidate). If the reload fails, the stale
+    value keeps being served.
+
+    With :source: (the name of another lazy attribute), the value is built from that
+    attribute: it shares its age, and is rebuilt whenever the source is reloaded, instead
+    of being revalidated on its own from a source that may itself be stale. Only give
+    :max_age: to attributes that fetch.
+
+    Use as @lazy, @lazy(max_age=...) or @lazy(source=...).
+    """
+    def __init__(self, fn=None, *, max_age=None, source=None, flight=flights):
+        self.max_age    = max_age
+        self.source     = source
+        self.flight     = flight
+        self.dependents = []
+        if fn is not None:
+            self(fn)
+
+    def __call__(self, fn):
+        self.fn      = fn
+        self.attr    = '_' + fn.__name__
+        self.__doc__ = fn.__doc__
+        return self
+
+    def __set_name__(self, owner, name):
+        self.attr = '_' + name
+        if self.source:
+            owner.__dict__[self.source].dependents.append(self)
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        try:
+            value = obj.__dict__[self.attr]
+        except KeyError:
+            return self.flight.do((obj, self.attr), lambda: self.load(obj))
+        self.check_age(obj)
+        return value
+
+    def check_age(self, obj):
+        if self.source:
+            # Built from the source as it was when the source was loaded
+            return getattr(type(obj), self.source).check_age(obj)
+        if self.max_age is None or time.time() - obj.__dict__.get(self.attr + '_at', 0) < self.max_age:
+            return
+        try:
+            self.flight.start((obj, self.attr), lambda: self.refresh(obj))
+        except Exception:
+            # The last reload failed recently; keep serving what we have
+            pass
+
+    def stamp(self, obj):
+        """When what a value computed now is based on was loaded; None if its source isn't loaded yet"""
+        if self.source:
+            return obj.__dict__.get('_' + self.source + '_at')
+        return time.time()
+
+    def store(self, obj, value, at=None):
+        obj.__dict__[self.attr] = value
+        obj.__dict__[self.attr + '_at'] = at or time.time()
+
+    def load(self, obj):
+        # Another flight may have finished between the check and the claim
+        if self.attr in obj.__dict__:
+            return obj.__dict__[self.attr]
+        # Taken before building, in case the source is reloaded meanwhile
+        at = self.stamp(obj)
+        with span(f'{type(obj).__name__}.{self.fn.__name__}'):
+            value = self.fn(obj)
+        self.store(obj, value, at or self.stamp(obj))
+        return value
+
+    def refresh(self, obj):
+        at = self.stamp(obj)
+        try:
+            value = self.fn(obj)
+        except Exception as e:
+            logging.warning(f'Failed to refresh {type(obj).__name__}.{self.fn.__name__}, serving stale data: {e}')
+            raise
+        self.store(obj, value, at)
+        # Rebuild what was built from the old value; what was never loaded stays cold
+        for dependent in self.dependents:
+            if dependent.attr in obj.__dict__:
+                try:
+                    dependent.refresh(obj)
+                except Exception:
+                    pass
+        return value
+
+def loaded_at(obj, name):
+    """When `obj.name` was last loaded (as a time.time() timestamp), or None if it never was"""
+    return obj.__dict__.get('_' + name + '_at')
+
+async def aget(obj, name):
+    """Await `obj.name`, loading it off the event loop if it is a cold lazy attribute"""
+    prop = getattr(type(obj), name)
+    if not isinstance(prop, lazy):
+        return getattr(obj, name)
+    try:
+        value = obj.__dict__[prop.attr]
+    except KeyError:
+        return await prop.flight.ado((obj, prop.attr), lambda: prop.load(obj))
+    prop.check_age(obj)
+    return value
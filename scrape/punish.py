@@ -0,0 +1,85 @@
+"""
+Shield punish lookups across the cast.
+
+Comparing a move against every move in the cast on each request is quadratic, so
+instead each character's moves are kept sorted by startup, split into grounded and
+aerial options. Asking "what punishes a move that is -N on shield" is then a binary
+search per character. A character's entry is rebuilt whenever their frame data loads.
+"""
+import bisect
+import re
+import threading
+
+# Frames spent getting out of shield before each kind of option can start.
+# Grounded options need the shield dropped first, aerials need a jump.
+OOS_FRAMES = {
+    'grounded': 6,
+    'aerial': 4,
+}
+
+def frames(value):
+    """The first (possibly negative) integer in a frame data field, or None"""
+    if value and (match := re.search(r'-?\d+', value)):
+        return int(match.group())
+    return None
+
+def kind(hitbox):
+    """Aerials have landing lag, everything else is treated as grounded"""
+    return 'aerial' if frames(hitbox.get('landlag')) is not None else 'grounded'
+
+def window(hitbox):
+    """
+    Frames the defender has to act after blocking :hitbox:, as (first active frame, last active frame).
+
+    shieldAdv is given for the first active frame; hitting later in the active window
+    leaves the attacker less time in endlag. Only the first window of a split one like
+    "4-5, 9-12" counts: the gap means the later window is a separate hit.
+    """
+    adv = frames(hitbox.get('shieldAdv'))
+    if adv is None:
+        return None
+    active = hitbox.get('active') or ''
+    first  = re.search(r'(\d+)(?:\s*-\s*(\d+))?', active)
+    late   = int(first.group(2)) - int(first.group(1)) if first and first.group(2) else 0
+    return (-adv, -adv - late)
+
+class PunishIndex:
+    def __init__(self):
+        self._lock    = threading.Lock()
+        # character -> kind -> (sorted startups, moves in the same order)
+        self.by_character = {}
+
+    def update(self, character, framedata):
+        """(Re)index one character's moves; called whenever their frame data is loaded"""
+        name = character.path.rsplit('/', 1)[-1]
+        moves = {'grounded': [], 'aerial': []}
+        for attack, hits in framedata.items():
+            for hit, hitbox in hits.items():
+                startup = frames(hitbox.get('startup'))
+                if startup is None or startup <= 0:
+                    continue
+                moves[kind(hitbox)].append((startup, attack, hit))
+        index = {}
+        for k, entries in moves.items():
+            entries.sort()
+            index[k] = ([startup for startup, *_ in entries], entries)
+        with self._lock:
+            self.by_character[name] = index
+
+    def punishers(self, window):
+        """
+        Every move in the cast that is out of shield within :window: frames
+
+        :return dict[str, list[tuple[int, str, str, str]]]: character -> (startup, attack, hit, kind)
+        """
+        with self._lock:
+            indexed = dict(self.by_character)
+        found = {}
+        for name, index in indexed.items():
+            moves = []
+            for k, (startups, entries) in index.items():
+                end = bisect.bisect_right(startups, window - OOS_FRAMES[k])
+                moves.extend((*entry, k) for entry in entries[:end])
+            if moves:
+                found[name] = sorted(moves)
+        return found
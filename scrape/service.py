@@ -0,0 +1,75 @@
+"""
+Long-lived Rivals 2 data layer.
+
+The rivals2 extension only defines commands and completers; the wiki, the characters
+and everything they have cached live on a Service. This module is not reloaded along
+with the extension, so bot.reload_extension('rivals2') picks up the same Service
+(and its warm caches) through get() instead of scraping the wiki again.
+"""
+import asyncio
+import logging
+import os
+import scrape.dragdown
+from scrape.lazy import aget, lazy
+from scrape.punish import PunishIndex, window
+from scrape.usage import Usage
+
+class Service:
+    def __init__(self, wiki=None, usage_path=None):
+        self.wiki       = wiki or scrape.dragdown.Wiki()
+        self.usage_path = usage_path or os.environ.get('USAGE_FILE', 'usage.json')
+        self.punish     = PunishIndex()
+        self.wiki.framedata_hooks.append(self.punish.update)
+
+    @lazy
+    def usage(self):
+        return Usage(self.usage_path)
+
+    @lazy(max_age=scrape.dragdown.MAX_AGE)
+    def characters(self):
+        # On revalidation, keep the (warm) Character objects we already have
+        old = self.__dict__.get('_characters', {})
+        return {name: old.get(name, char) for name, char in scrape.dragdown.characterlist(self.wiki).items()}
+
+    @lazy(max_age=scrape.dragdown.MAX_AGE)
+    def emotes(self):
+        return scrape.dragdown.emotelist(self.wiki)
+
+    def reset_characters(self):
+        """Replace every character with a fresh (cold) one from the character select page"""
+        # Swap in a new dict; completers may be iterating over the old one in another thread
+        type(self).characters.store(self, scrape.dragdown.characterlist(self.wiki))
+
+    async def punishers(self, character, attack, hit=None):
+        """
+        Moves across the cast that punish :attack: (or just its :hit:) on shield
+
+        :return: (guaranteed, early): the punishers when the move hits shield on its last
+            active frame, and those that only work if it hits on its first. Without :hit:,
+            the least punishable hit decides.
+        """
+        # The index only covers characters whose frame data has been loaded
+        characters = await aget(self, 'characters')
+        await asyncio.gather(*(aget(c, 'framedata') for c in characters.values()), return_exceptions=True)
+        hits = (await aget(characters[character], 'framedata'))[attack]
+        windows = [w for w in map(window, [hits[hit]] if hit else hits.values()) if w]
+        if not windows:
+            raise KeyError('shieldAdv')
+        first, last = min(w[0] for w in windows), min(w[1] for w in windows)
+        guaranteed = self.punish.punishers(last)
+        early = {name: [move for move in moves if move not in guaranteed.get(name, [])]
+                 for name, moves in self.punish.punishers(first).items()}
+        return guaranteed, {name: moves for name, moves in early.items() if moves}
+
+    def warm(self):
+        """Load what every command needs; run in the background once the bot is up"""
+        logging.info(f'Fetched {len(self.characters)} characters and {len(self.emotes)} emotes')
+
+_service = None
+
+def get():
+    """The process-wide Service, created on first use; nothing is fetched until it is needed"""
+    global _service
+    if _service is None:
+        _service = Service()
+    return _service
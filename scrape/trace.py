@@ -0,0 +1,132 @@
+"""
+Lightweight tracing spans.
+
+Each interaction gets a root span; anything traced while it runs (fetches, lazy loads,
+parsing, rendering) nests under it, including work done in single-flight threads.
+Interactions slower than TRACE_SLOW_MS are written to the 'slow' logger with their
+span tree.
+
+Configured from the environment:
+- TRACE: set to 1 to record spans (when unset, span() returns a shared no-op)
+- TRACE_SLOW_MS: slow interaction threshold in milliseconds (default 2000)
+- TRACE_PROFILE: name of a command to run under cProfile, stats are dumped to
+  TRACE_PROFILE_DIR (default: current directory). Only the event loop thread is
+  profiled, not loads running in single-flight threads. Only one interaction is
+  profiled at a time; others that overlap it run unprofiled.
+"""
+import contextvars
+import cProfile
+import functools
+import itertools
+import logging
+import os
+import threading
+import time
+
+ENABLED     = os.environ.get('TRACE', '') not in ('', '0')
+SLOW_MS     = float(os.environ.get('TRACE_SLOW_MS', 2000))
+PROFILE     = os.environ.get('TRACE_PROFILE')
+PROFILE_DIR = os.environ.get('TRACE_PROFILE_DIR', '.')
+
+slowlog = logging.getLogger('slow')
+
+# cProfile allows one active profiler per process (3.12+ raises otherwise)
+_profiling = threading.Lock()
+_profiles  = itertools.count()
+
+_current = contextvars.ContextVar('span', default=None)
+
+class Span:
+    __slots__ = ('name', 'start', 'end', 'children', '_token')
+
+    def __init__(self, name):
+        self.name     = name
+        self.start    = None
+        self.end      = None
+        self.children = []
+
+    def __enter__(self):
+        parent = _current.get()
+        if parent is not None:
+            parent.children.append(self)
+        self._token = _current.set(self)
+        self.start  = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.end = time.perf_counter()
+        _current.reset(self._token)
+
+    @property
+    def ms(self):
+        end = self.end if self.end is not None else time.perf_counter()
+        return 1000 * (end - self.start)
+
+    def tree(self, depth=0):
+        lines = [f'{"  " * depth}{self.name}: {self.ms:.1f}ms' + ('' if self.end is not None else ' (unfinished)')]
+        for child in self.children:
+            lines.extend(child.tree(depth + 1))
+        return lines
+
+    def __str__(self):
+        return '\n'.join(self.tree())
+
+class _Noop:
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *args):
+        pass
+
+NOOP = _Noop()
+
+def span(name):
+    """Time a block as a child of the current span; a no-op outside of a traced interaction"""
+    if not ENABLED or _current.get() is None:
+        return NOOP
+    return Span(name)
+
+def traced(name):
+    """Decorator form of span()"""
+    def decorator(f):
+        @functools.wraps(f)
+        def wrapped(*args, **kwargs):
+            with span(name):
+                return f(*args, **kwargs)
+        return wrapped
+    return decorator
+
+def command(f):
+    """
+    Trace a Cog command as the root span of its interaction.
+
+    Apply it directly to the callback (below any @option decorators); functools.wraps
+    keeps the signature py-cord reads the options from.
+    """
+    name = f.__name__
+    @functools.wraps(f)
+    async def wrapped(self, ctx, *args, **kwargs):
+        profiler = None
+        if PROFILE == name and _profiling.acquire(blocking=False):
+            profiler = cProfile.Profile()
+        if not ENABLED and not profiler:
+            return await f(self, ctx, *args, **kwargs)
+        root = Span(f'/{name}')
+        try:
+            with root:
+                if profiler:
+                    profiler.enable()
+                try:
+                    return await f(self, ctx, *args, **kwargs)
+                finally:
+                    if profiler:
+                        profiler.disable()
+                        _profiling.release()
+        finally:
+            if ENABLED and root.ms > SLOW_MS:
+                slowlog.warning(f'Slow interaction {ctx.user} {args} {kwargs}\n{root}')
+            if profiler:
+                path = os.path.join(PROFILE_DIR, f'{name}-{time.strftime("%Y%m%d-%H%M%S")}-{os.getpid()}-{next(_profiles)}.prof')
+                profiler.dump_stats(path)
+                logging.info(f'Wrote profile for /{name} to {path}')
+    return wrapped
@@ -0,0 +1,68 @@
+"""
+Decayed usage counts for ranking autocomplete results.
+
+Counts halve every :halflife: seconds, so what people looked up after the latest patch
+outranks what they looked up months ago. They are kept in a compact JSON file of
+{key: [count, last_used]}, written every few lookups and when the cog unloads.
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+class Usage:
+    SEP = '\x1f'
+
+    def __init__(self, path='usage.json', halflife=14 * 86400, save_every=20):
+        self.path       = path
+        self.halflife   = halflife
+        self.save_every = save_every
+        self.counts     = {}
+        self._dirty     = 0
+        self._lock      = threading.Lock()
+        try:
+            with open(path) as f:
+                self.counts = json.load(f)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logging.warning(f'Could not read usage counts from {path}', exc_info=e)
+
+    def _decayed(self, entry, now):
+        count, last = entry
+        return count * 0.5 ** ((now - last) / self.halflife)
+
+    def score(self, scope, value, now=None):
+        entry = self.counts.get(self.SEP.join((*scope, value)))
+        if not entry:
+            return 0.0
+        return self._decayed(entry, now or time.time())
+
+    def record(self, scope, value):
+        """Count one use of :value: for the option identified by :scope: (command, option, *parents)"""
+        if value is None:
+            return
+        key = self.SEP.join((*scope, value))
+        now = time.time()
+        with self._lock:
+            entry = self.counts.get(key)
+            self.counts[key] = [round((self._decayed(entry, now) if entry else 0) + 1, 3), int(now)]
+            self._dirty += 1
+            if self._dirty < self.save_every:
+                return
+        self.save()
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            data = json.dumps(self.counts, separators=(',', ':'))
+            self._dirty = 0
+        tmp = self.path + '.tmp'
+        try:
+            with open(tmp, 'w') as f:
+                f.write(data)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logging.warning(f'Could not save usage counts to {self.path}', exc_info=e)
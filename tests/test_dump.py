@@ -0,0 +1,48 @@
+"""
+DumpSource against a small inline Special:Export dump.
+"""
+import io
+import scrape.dragdown as dragdown
+
+DUMP = '''<mediawiki xmlns="http://www.mediawiki.org/xml/export-0.11/" version="0.11">
+<siteinfo><namespaces><namespace key="4" case="first-letter">Dragdown</namespace></namespaces></siteinfo>
+<page><title>Dragdown:ROA2 Character Select</title><ns>4</ns>
+  <revision><text>{{Card|character=Maypul|icon=1}}</text></revision></page>
+<page><title>Template:CharLinks</title><ns>10</ns>
+  <revision><text>[[{{{charMainPage}}}/Data]]</text></revision></page>
+<page><title>RoA2/Maypul/Data</title><ns>0</ns>
+  <revision><text>{{FrameData-ROA2|attack=Jab|name=Old}}</text></revision>
+  <revision><text>{{FrameData-ROA2|attack=Jab|name=Hit 1}}</text></revision></page>
+<page><title>RoA2/May</title><ns>0</ns><redirect title="RoA2/Maypul/Data"/>
+  <revision><text>#REDIRECT [[RoA2/Maypul/Data]]</text></revision></page>
+<page><title>SSBU/Mario</title><ns>0</ns>
+  <revision><text>Not a Rivals 2 page</text></revision></page>
+</mediawiki>
+'''
+
+def source():
+    return dragdown.DumpSource(io.BytesIO(DUMP.encode()))
+
+def test_latest_revision():
+    page = source().get('RoA2/Maypul/Data')
+    assert page.ok and page.content == b'{{FrameData-ROA2|attack=Jab|name=Hit 1}}'
+
+def test_project_namespace_and_titles():
+    dump = source()
+    assert dump.get('Project:ROA2_Character_Select').content == b'{{Card|character=Maypul|icon=1}}'
+    assert dump.get('Template:CharLinks').ok
+
+def test_redirect():
+    assert source().get('RoA2/May').content == b'{{FrameData-ROA2|attack=Jab|name=Hit 1}}'
+
+def test_only_keeps_pages_loaders_read():
+    dump = source()
+    assert 'SSBU/Mario' not in dump.texts
+    assert not dump.get('SSBU/Mario').ok
+    assert not dump.get('RoA2/Nobody').ok
+
+def test_wiki_over_dump():
+    wiki = dragdown.Wiki(source=source())
+    characters = dragdown.characterlist(wiki)
+    assert list(characters) == ['Maypul']
+    assert list(characters['Maypul'].framedata['Jab']) == ['Hit 1']
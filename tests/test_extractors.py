@@ -0,0 +1,55 @@
+"""
+Differential tests: the streaming extractors must give the same result as parsing the whole page.
+"""
+import pathlib
+import pytest
+import scrape.dragdown as dragdown
+
+DATA = pathlib.Path(__file__).parent / 'data'
+
+def framedata_text():
+    return (DATA / 'RoA2_Maypul_Data.wikitext').read_text()
+
+def emotes_text():
+    return (DATA / 'RoA2_Emotes.wikitext').read_text()
+
+def test_framedata_matches_full_parse():
+    text = framedata_text()
+    assert dragdown.framedata_streaming(text) == dragdown.framedata_parsed(text)
+
+def test_framedata_contents():
+    framedata = dragdown.framedata_streaming(framedata_text())
+    # Commented out and <nowiki> templates are not frame data
+    assert list(framedata) == ['Jab', 'Forward Tilt', 'Nair']
+    assert list(framedata['Jab']) == ['Jab 1', 'Jab 2']
+    assert framedata['Jab']['Jab 1']['notes'] == 'Maypul looks happy :} while doing it'
+
+@pytest.mark.parametrize('text', [
+    # A stray brace inside a parameter must not end the template
+    '{{FrameData-ROA2|attack=Jab|name=J1|notes=uses :} face|startup=4}}{{FrameData-ROA2|attack=Ftilt|name=F|startup=7}}',
+    '{{FrameData-ROA2|attack=Jab|name=J1|notes={ open|startup=4}}\n{{FrameData-ROA2|attack=Ftilt|name=F|startup=7}}',
+    '<!-- {{FrameData-ROA2|attack=Old|name=X}} -->{{FrameData-ROA2|attack=Jab|name=J1}}',
+    '<nowiki>{{FrameData-ROA2|attack=Old|name=X}}</nowiki>{{FrameData-ROA2|attack=Jab|name=J1}}',
+    '{{FrameData-ROA2|attack=Jab|name=J1|startup={{{1|5}}}}}',
+])
+def test_framedata_edge_cases(text):
+    assert dragdown.framedata_streaming(text) == dragdown.framedata_parsed(text)
+
+def test_stray_braces_keep_both_templates():
+    text = '{{FrameData-ROA2|attack=Jab|name=J1|notes=uses :} face|startup=4}}{{FrameData-ROA2|attack=Ftilt|name=F|startup=7}}'
+    assert list(dragdown.framedata_streaming(text)) == ['Jab', 'Ftilt']
+
+def test_fragment_must_be_one_template():
+    with pytest.raises(ValueError):
+        dragdown.parse_template('{{FrameData-ROA2|attack=Jab}} trailing')
+
+def test_emotes_match_full_parse():
+    text = emotes_text()
+    emotes = dragdown.emotes_streaming(None, text)
+    assert emotes == dragdown.emotes_parsed(None, text)
+    assert list(emotes) == ['Wave "Hi!"', 'Bow "Thank you :}"', 'Gg "GG"']
+
+def test_extract_falls_back_on_failure():
+    def fast():
+        raise ValueError('nope')
+    assert dragdown.extract(fast, lambda: 'full', 'test') == 'full'